@@ -3,27 +3,54 @@
 Advanced analysis to understand non-linear patterns
 """
 
-import json
-import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import PolynomialFeatures
-from sklearn.ensemble import RandomForestRegressor
+from cases_cache import load_cases
+
+class LeastSquares:
+    """Drop-in for the parts of sklearn's LinearRegression used here, via one lstsq call"""
+    
+    def fit(self, X, y):
+        X_aug = np.c_[np.ones(len(X)), X]
+        coef, *_ = np.linalg.lstsq(X_aug, y, rcond=None)
+        self.intercept_ = coef[0]
+        self.coef_ = coef[1:]
+        return self
+    
+    def predict(self, X):
+        return self.intercept_ + np.asarray(X) @ self.coef_
+    
+    def score(self, X, y):
+        """R-squared of the fit on (X, y)"""
+        residuals = y - self.predict(X)
+        deviations = y - y.mean()
+        return 1 - (residuals @ residuals) / (deviations @ deviations)
+
+QUADRATIC_FEATURE_NAMES = [
+    'days', 'miles', 'receipts',
+    'days^2', 'days miles', 'days receipts',
+    'miles^2', 'miles receipts',
+    'receipts^2'
+]
+
+def quadratic_features(X):
+    """Degree-2 expansion of an (N, 3) array, in PolynomialFeatures column order"""
+    n, f = X.shape
+    X_poly = np.empty((n, f + f * (f + 1) // 2))
+    X_poly[:, :f] = X
+    
+    # Fill each product column in place
+    k = f
+    for i in range(f):
+        for j in range(i, f):
+            np.multiply(X[:, i], X[:, j], out=X_poly[:, k])
+            k += 1
+    
+    return X_poly
 
 def load_data():
-    with open('public_cases.json', 'r') as f:
-        data = json.load(f)
-    
-    df = pd.DataFrame([{
-        'days': case['input']['trip_duration_days'],
-        'miles': case['input']['miles_traveled'],  
-        'receipts': case['input']['total_receipts_amount'],
-        'expected': case['expected_output']
-    } for case in data])
-    
-    # Add derived features
-    df['miles_per_day'] = df['miles'] / df['days']
-    df['receipts_per_day'] = df['receipts'] / df['days']
+    df = load_cases()
+    
+    # Add derived features (per-day ratios come precomputed)
     df['total_inputs'] = df['days'] + df['miles'] + df['receipts']
     
     return df
@@ -52,17 +79,18 @@ def analyze_interaction_effects(df):
     print("\n\nAnalyzing interaction effects...")
     print("-" * 60)
     
-    # Create interaction features
-    df['days_miles'] = df['days'] * df['miles']
-    df['days_receipts'] = df['days'] * df['receipts']
-    df['miles_receipts'] = df['miles'] * df['receipts']
-    
-    # Fit model with interactions
+    # Design matrix with the interaction columns
     features = ['days', 'miles', 'receipts', 'days_miles', 'days_receipts', 'miles_receipts']
-    X = df[features].values
+    d, m, r = (df[c].to_numpy() for c in ('days', 'miles', 'receipts'))
+    X = np.empty((len(df), len(features)))
+    X[:, 0], X[:, 1], X[:, 2] = d, m, r
+    np.multiply(d, m, out=X[:, 3])
+    np.multiply(d, r, out=X[:, 4])
+    np.multiply(m, r, out=X[:, 5])
     y = df['expected'].values
     
-    model = LinearRegression()
+    # Fit model with interactions
+    model = LeastSquares()
     model.fit(X, y)
     
     print("Linear model with interactions:")
@@ -87,25 +115,23 @@ def analyze_polynomial_effects(df):
     y = df['expected'].values
     
     # Create polynomial features (degree 2)
-    poly = PolynomialFeatures(degree=2, include_bias=False)
-    X_poly = poly.fit_transform(X)
+    X_poly = quadratic_features(X)
     
-    model = LinearRegression()
+    model = LeastSquares()
     model.fit(X_poly, y)
     
     print(f"Polynomial model (degree 2):")
     print(f"  Number of features: {X_poly.shape[1]}")
     print(f"  R-squared: {model.score(X_poly, y):.4f}")
     
-    # Get feature names and show most important
-    feature_names = poly.get_feature_names_out(['days', 'miles', 'receipts'])
-    coef_importance = sorted(zip(feature_names, model.coef_), key=lambda x: abs(x[1]), reverse=True)
+    # Show most important features
+    coef_importance = sorted(zip(QUADRATIC_FEATURE_NAMES, model.coef_), key=lambda x: abs(x[1]), reverse=True)
     
     print("\nMost important features:")
     for name, coef in coef_importance[:10]:
         print(f"  {name}: {coef:.6f}")
     
-    return model, poly
+    return model
 
 def test_models_on_problem_cases(df, models):
     """Test models on the problem cases"""
@@ -123,22 +149,17 @@ def test_models_on_problem_cases(df, models):
         (1, 55, 3.6, 126.06)
     ]
     
-    linear_model, interaction_model, poly_model, poly_transformer = models
-    
-    for days, miles, receipts, expected in problem_cases:
-        # Linear prediction
-        linear_pred = linear_model.predict([[days, miles, receipts]])[0]
-        
-        # Interaction prediction
-        days_miles = days * miles
-        days_receipts = days * receipts
-        miles_receipts = miles * receipts
-        interaction_pred = interaction_model.predict([[days, miles, receipts, days_miles, days_receipts, miles_receipts]])[0]
-        
-        # Polynomial prediction
-        poly_features = poly_transformer.transform([[days, miles, receipts]])
-        poly_pred = poly_model.predict(poly_features)[0]
-        
+    linear_model, interaction_model, poly_model = models
+    
+    X = np.array([(days, miles, receipts) for days, miles, receipts, _ in problem_cases], dtype=np.float64)
+    X_interaction = np.column_stack([X, X[:, 0] * X[:, 1], X[:, 0] * X[:, 2], X[:, 1] * X[:, 2]])
+    
+    linear_preds = linear_model.predict(X)
+    interaction_preds = interaction_model.predict(X_interaction)
+    poly_preds = poly_model.predict(quadratic_features(X))
+    
+    for (days, miles, receipts, expected), linear_pred, interaction_pred, poly_pred in zip(
+            problem_cases, linear_preds, interaction_preds, poly_preds):
         print(f"{days}d, {miles}mi, ${receipts:.2f} (expected: ${expected:.2f})")
         print(f"  Linear: ${linear_pred:.2f} (error: ${abs(linear_pred - expected):.2f})")
         print(f"  Interaction: ${interaction_pred:.2f} (error: ${abs(interaction_pred - expected):.2f})")
@@ -150,32 +171,31 @@ def analyze_specific_patterns(df):
     print("\n\nAnalyzing specific patterns...")
     print("-" * 60)
     
+    days = df['days'].to_numpy()
+    expected = df['expected'].to_numpy()
+    efficiency = df['miles_per_day'].to_numpy()
+    
     # 5-day trips
-    five_day = df[df['days'] == 5]
-    other_days = df[df['days'].isin([4, 6])]
+    five_day = days == 5
+    other_days = (days == 4) | (days == 6)
     
     print("5-day trip analysis:")
-    print(f"  5-day average: ${five_day['expected'].mean():.2f}")
-    print(f"  4,6-day average: ${other_days['expected'].mean():.2f}")
+    print(f"  5-day average: ${expected[five_day].mean():.2f}")
+    print(f"  4,6-day average: ${expected[other_days].mean():.2f}")
     
     # Rounding bug
-    df['ends_49'] = df['receipts'].apply(lambda x: str(x).endswith('.49'))
-    df['ends_99'] = df['receipts'].apply(lambda x: str(x).endswith('.99'))
-    df['has_rounding'] = df['ends_49'] | df['ends_99']
-    
-    rounding = df[df['has_rounding']]
-    normal = df[~df['has_rounding']]
+    cents = np.rint(df['receipts'].to_numpy() * 100).astype(np.int64) % 100
+    has_rounding = (cents == 49) | (cents == 99)
     
     print(f"\nRounding bug analysis:")
-    print(f"  With .49/.99: ${rounding['expected'].mean():.2f} (n={len(rounding)})")
-    print(f"  Normal: ${normal['expected'].mean():.2f} (n={len(normal)})")
+    print(f"  With .49/.99: ${expected[has_rounding].mean():.2f} (n={has_rounding.sum()})")
+    print(f"  Normal: ${expected[~has_rounding].mean():.2f} (n={(~has_rounding).sum()})")
     
     # Efficiency analysis
-    df['efficiency'] = df['miles_per_day']
-    sweet_spot = df[(df['efficiency'] >= 180) & (df['efficiency'] <= 220)]
+    sweet_spot = (efficiency >= 180) & (efficiency <= 220)
     print(f"\nEfficiency sweet spot (180-220 mi/day):")
-    print(f"  Cases: {len(sweet_spot)}")
-    print(f"  Average reimbursement: ${sweet_spot['expected'].mean():.2f}")
+    print(f"  Cases: {sweet_spot.sum()}")
+    print(f"  Average reimbursement: ${expected[sweet_spot].mean():.2f}")
 
 if __name__ == "__main__":
     df = load_data()
@@ -186,18 +206,18 @@ if __name__ == "__main__":
     # Simple linear
     X_linear = df[['days', 'miles', 'receipts']].values
     y = df['expected'].values
-    linear_model = LinearRegression().fit(X_linear, y)
+    linear_model = LeastSquares().fit(X_linear, y)
     
     # With interactions
     interaction_model, features = analyze_interaction_effects(df)
     
     # Polynomial
-    poly_model, poly_transformer = analyze_polynomial_effects(df)
+    poly_model = analyze_polynomial_effects(df)
     
     # Analyze patterns
     analyze_long_trips(df)
     analyze_specific_patterns(df)
     
     # Test models
-    models = (linear_model, interaction_model, poly_model, poly_transformer)
+    models = (linear_model, interaction_model, poly_model)
     test_models_on_problem_cases(df, models) 
\ No newline at end of file
@@ -4,41 +4,22 @@ Black Box Reimbursement System - Data Analysis
 Phase 1: Pattern Discovery and Analysis
 """
 
-import json
+import sys
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 from collections import defaultdict
-
-# Set up plotting style
-plt.style.use('default')
-sns.set_palette("husl")
+from cases_cache import load_cases
 
 def load_data():
     """Load the public cases data"""
-    with open('public_cases.json', 'r') as f:
-        data = json.load(f)
-    
-    # Convert to DataFrame for easier analysis
-    records = []
-    for case in data:
-        record = {
-            'days': case['input']['trip_duration_days'],
-            'miles': case['input']['miles_traveled'],
-            'receipts': case['input']['total_receipts_amount'],
-            'reimbursement': case['expected_output']
-        }
-        records.append(record)
-    
-    df = pd.DataFrame(records)
-    
-    # Add derived features
-    df['miles_per_day'] = df['miles'] / df['days']
-    df['spending_per_day'] = df['receipts'] / df['days']
+    df = load_cases().rename(columns={'expected': 'reimbursement',
+                                      'receipts_per_day': 'spending_per_day'})
+    
+    # Add derived features (miles_per_day and spending_per_day come precomputed)
     df['reimbursement_per_day'] = df['reimbursement'] / df['days']
-    df['receipt_ends_49'] = df['receipts'].apply(lambda x: str(x).endswith('.49'))
-    df['receipt_ends_99'] = df['receipts'].apply(lambda x: str(x).endswith('.99'))
+    cents = np.rint(df['receipts'].to_numpy() * 100).astype(np.int64) % 100
+    df['receipt_ends_49'] = cents == 49
+    df['receipt_ends_99'] = cents == 99
     
     return df
 
@@ -87,19 +68,49 @@ def analyze_five_day_bonus(df):
             five_day_bonus = five_day_avg - (four_day_avg + six_day_avg) / 2
             print(f"\nEstimated 5-day bonus per day: ${five_day_bonus:.2f}")
 
+def binned_stats(values, bins, columns, name):
+    """Count and per-bin means for (bins[i], bins[i+1]] buckets, matching pd.cut + groupby
+    
+    columns maps a column label to a (values, aggs) tuple, where aggs lists
+    'count' and/or 'mean' as in a groupby agg spec; any other agg raises ValueError.
+    Uses np.digitize + np.bincount.
+    """
+    for label, (_, aggs) in columns.items():
+        unsupported = [agg for agg in aggs if agg not in ('count', 'mean')]
+        if unsupported:
+            raise ValueError(f"unsupported aggregation(s) {unsupported} for {label!r}; use 'count' or 'mean'")
+    
+    n_bins = len(bins) - 1
+    idx = np.digitize(values, bins, right=True) - 1
+    in_range = (idx >= 0) & (idx < n_bins)
+    idx = idx[in_range]
+    counts = np.bincount(idx, minlength=n_bins)
+    
+    stats = {}
+    for label, (col, aggs) in columns.items():
+        for agg in aggs:
+            if agg == 'count':
+                stats[(label, 'count')] = counts
+            elif agg == 'mean':
+                sums = np.bincount(idx, weights=col[in_range], minlength=n_bins)
+                with np.errstate(invalid='ignore'):
+                    stats[(label, 'mean')] = sums / counts
+    
+    index = pd.Index([f"({bins[i]}, {bins[i + 1]}]" for i in range(n_bins)], name=name)
+    return pd.DataFrame(stats, index=index)
+
 def analyze_mileage_tiers(df):
     """Analyze mileage reimbursement tiers"""
     print("\n=== MILEAGE TIER ANALYSIS ===\n")
     
     # Create mileage bins
     mile_bins = [0, 50, 100, 200, 300, 500, 1000]
-    df['mile_category'] = pd.cut(df['miles'], bins=mile_bins)
     
     # Analyze reimbursement by mileage tier
-    mileage_analysis = df.groupby('mile_category').agg({
-        'reimbursement': ['count', 'mean'],
-        'miles': 'mean'
-    })
+    mileage_analysis = binned_stats(df['miles'].to_numpy(), mile_bins, {
+        'reimbursement': (df['reimbursement'].to_numpy(), ['count', 'mean']),
+        'miles': (df['miles'].to_numpy(), ['mean'])
+    }, name='mile_category')
     
     print("Reimbursement by mileage tier:")
     print(mileage_analysis)
@@ -146,16 +157,24 @@ def analyze_receipt_patterns(df):
     # Compare similar trips with and without rounding
     if len(rounding_bug) > 0:
         print("\nComparing similar trips with/without rounding bug:")
-        for _, bug_case in rounding_bug.head(5).iterrows():
-            # Find similar normal cases
-            similar = normal[
-                (normal['days'] == bug_case['days']) &
-                (abs(normal['miles'] - bug_case['miles']) < 20) &
-                (abs(normal['receipts'] - bug_case['receipts']) < 50)
-            ]
-            if len(similar) > 0:
-                diff = bug_case['reimbursement'] - similar['reimbursement'].mean()
-                print(f"  {bug_case['days']}d, {bug_case['miles']}mi, ${bug_case['receipts']:.2f}: "
+        bug_cases = rounding_bug.head(5)
+        bug_days, bug_miles, bug_receipts = (bug_cases[c].to_numpy()[:, None] for c in ('days', 'miles', 'receipts'))
+        
+        # Find similar normal cases
+        similar = (
+            (normal['days'].to_numpy() == bug_days) &
+            (np.abs(normal['miles'].to_numpy() - bug_miles) < 20) &
+            (np.abs(normal['receipts'].to_numpy() - bug_receipts) < 50)
+        )
+        similar_counts = similar.sum(axis=1)
+        similar_totals = similar @ normal['reimbursement'].to_numpy()
+        
+        for days, miles, receipts, reimbursement, count, total in zip(
+                bug_cases['days'], bug_cases['miles'], bug_cases['receipts'],
+                bug_cases['reimbursement'], similar_counts, similar_totals):
+            if count > 0:
+                diff = reimbursement - total / count
+                print(f"  {days}d, {miles}mi, ${receipts:.2f}: "
                       f"Bonus = ${diff:.2f}")
 
 def analyze_efficiency_patterns(df):
@@ -164,13 +183,12 @@ def analyze_efficiency_patterns(df):
     
     # Create efficiency bins based on Kevin's insights (180-220 optimal)
     efficiency_bins = [0, 50, 100, 150, 180, 220, 300, 400, 1000]
-    df['efficiency_category'] = pd.cut(df['miles_per_day'], bins=efficiency_bins)
     
-    efficiency_analysis = df.groupby('efficiency_category').agg({
-        'reimbursement': ['count', 'mean'],
-        'reimbursement_per_day': 'mean',
-        'miles_per_day': 'mean'
-    })
+    efficiency_analysis = binned_stats(df['miles_per_day'].to_numpy(), efficiency_bins, {
+        'reimbursement': (df['reimbursement'].to_numpy(), ['count', 'mean']),
+        'reimbursement_per_day': (df['reimbursement_per_day'].to_numpy(), ['mean']),
+        'miles_per_day': (df['miles_per_day'].to_numpy(), ['mean'])
+    }, name='efficiency_category')
     
     print("Reimbursement by efficiency (miles/day):")
     print(efficiency_analysis)
@@ -186,6 +204,16 @@ def analyze_efficiency_patterns(df):
 
 def create_visualizations(df):
     """Create visualization plots for pattern discovery"""
+    # Imported here so headless analysis runs never load matplotlib
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    
+    # Set up plotting style
+    plt.style.use('default')
+    sns.set_palette("husl")
+    
     fig, axes = plt.subplots(2, 3, figsize=(18, 12))
     fig.suptitle('Black Box Reimbursement System - Pattern Analysis', fontsize=16)
     
@@ -236,45 +264,41 @@ def create_visualizations(df):
     ax.set_title('Distribution of Reimbursements')
     
     plt.tight_layout()
-    plt.savefig('pattern_analysis.png', dpi=300, bbox_inches='tight')
+    plt.savefig('pattern_analysis.png', dpi=100, bbox_inches='tight')
     print("\nVisualizations saved to pattern_analysis.png")
 
 def find_specific_patterns(df):
     """Look for specific patterns mentioned in interviews"""
     print("\n=== SPECIFIC PATTERN SEARCH ===\n")
     
+    days = df['days'].to_numpy()
+    miles_per_day = df['miles_per_day'].to_numpy()
+    spending_per_day = df['spending_per_day'].to_numpy()
+    reimbursement = df['reimbursement'].to_numpy()
+    reimbursement_per_day = df['reimbursement_per_day'].to_numpy()
+    
     # Kevin's "sweet spot combo": 5 days, 180+ miles/day, <$100/day spending
-    sweet_combo = df[
-        (df['days'] == 5) &
-        (df['miles_per_day'] >= 180) &
-        (df['spending_per_day'] < 100)
-    ]
+    sweet_combo = (days == 5) & (miles_per_day >= 180) & (spending_per_day < 100)
     
-    print(f"Kevin's 'sweet spot combo' cases: {len(sweet_combo)}")
-    if len(sweet_combo) > 0:
-        print(f"Average reimbursement: ${sweet_combo['reimbursement'].mean():.2f}")
-        print(f"Average per day: ${sweet_combo['reimbursement_per_day'].mean():.2f}")
+    print(f"Kevin's 'sweet spot combo' cases: {sweet_combo.sum()}")
+    if sweet_combo.any():
+        print(f"Average reimbursement: ${reimbursement[sweet_combo].mean():.2f}")
+        print(f"Average per day: ${reimbursement_per_day[sweet_combo].mean():.2f}")
     
     # "Vacation penalty": 8+ days with high spending
-    vacation_penalty = df[
-        (df['days'] >= 8) &
-        (df['spending_per_day'] > 150)
-    ]
+    vacation_penalty = (days >= 8) & (spending_per_day > 150)
     
-    print(f"\n'Vacation penalty' cases (8+ days, high spending): {len(vacation_penalty)}")
-    if len(vacation_penalty) > 0:
-        print(f"Average reimbursement per day: ${vacation_penalty['reimbursement_per_day'].mean():.2f}")
+    print(f"\n'Vacation penalty' cases (8+ days, high spending): {vacation_penalty.sum()}")
+    if vacation_penalty.any():
+        print(f"Average reimbursement per day: ${reimbursement_per_day[vacation_penalty].mean():.2f}")
     
     # Compare to similar duration with lower spending
-    normal_long = df[
-        (df['days'] >= 8) &
-        (df['spending_per_day'] <= 100)
-    ]
-    if len(normal_long) > 0:
-        print(f"Normal long trips (8+ days, moderate spending): ${normal_long['reimbursement_per_day'].mean():.2f}/day")
+    normal_long = (days >= 8) & (spending_per_day <= 100)
+    if normal_long.any():
+        print(f"Normal long trips (8+ days, moderate spending): ${reimbursement_per_day[normal_long].mean():.2f}/day")
 
-def main():
-    """Main analysis function"""
+def main(plot=False):
+    """Main analysis function; plot=True also renders pattern_analysis.png"""
     print("Loading data...")
     df = load_data()
     
@@ -287,8 +311,11 @@ def main():
     find_specific_patterns(df)
     
     # Create visualizations
-    print("\nCreating visualizations...")
-    create_visualizations(df)
+    if plot:
+        print("\nCreating visualizations...")
+        create_visualizations(df)
+    else:
+        print("\nSkipping visualizations (pass --plot to create pattern_analysis.png)")
     
     # Save processed data for next phase
     df.to_csv('processed_data.csv', index=False)
@@ -306,4 +333,4 @@ def main():
     return df
 
 if __name__ == "__main__":
-    df = main() 
\ No newline at end of file
+    df = main(plot='--plot' in sys.argv[1:]) 
\ No newline at end of file
@@ -1,8 +1,73 @@
 #!/usr/bin/env python3
-"""Pure rule-based reimbursement calculator (no external model)."""
+"""Pure rule-based reimbursement calculator (no external model).
 
+run.sh starts a fresh interpreter per case, so module-level imports are
+kept to the standard library; numpy is imported only inside the batch
+paths, and the numba variant lives in reimburse_jit.
+"""
 
-def reimburse(days: int, miles: int, receipts: float) -> float:
+import sys
+import warnings
+from functools import lru_cache
+
+
+# Trip-length buckets. Every rule that looks at the day count goes through
+# _day_bucket(), so the scalar, batch and compiled paths share one definition.
+_SHORT, _FIVE_DAY, _ONE_WEEK, _TWO_WEEK, _OTHER = range(5)
+_SHORT_BELOW = 2  # trips shorter than this many days are short
+_DAY_RANGES = (   # (bucket, first day, last day), inclusive
+    (_FIVE_DAY, 5, 5),
+    (_ONE_WEEK, 7, 8),
+    (_TWO_WEEK, 11, 14),
+)
+
+
+def _day_bucket(days):
+    """Trip-length bucket for a day count; comparisons only, so float days work."""
+    if days < _SHORT_BELOW:
+        return _SHORT
+    for bucket, first, last in _DAY_RANGES:
+        if first <= days <= last:
+            return bucket
+    return _OTHER
+
+
+def _adjustment(bucket, high_value, rounding_bug, efficient):
+    """(day_factor, efficiency_factor) the adjustment rules apply to a case."""
+    if rounding_bug:
+        return 0.457, 1.0
+
+    # A 13-14 day high-value rule (x1.20) used to follow the 11-14 one here;
+    # it was shadowed by it and never applied, so it is not carried over.
+    if bucket == _FIVE_DAY:
+        day_factor = 0.92
+    elif bucket == _ONE_WEEK and high_value:
+        day_factor = 1.25
+    elif bucket == _TWO_WEEK and high_value:
+        day_factor = 0.85
+    elif bucket == _SHORT:
+        day_factor = 1.15
+    else:
+        day_factor = 1.0
+
+    return day_factor, 1.03 if efficient else 1.0
+
+
+# The rules evaluated once per feature combination at import.
+# Indexed by ((bucket * 2 + high_value) * 2 + rounding_bug) * 2 + efficient.
+# Factors are kept as a pair rather than pre-multiplied so results match the
+# sequential multiplications bit for bit.
+_ADJUSTMENTS = tuple(
+    _adjustment(bucket, high_value, rounding_bug, efficient)
+    for bucket in range(_OTHER + 1)
+    for high_value in (False, True)
+    for rounding_bug in (False, True)
+    for efficient in (False, True)
+)
+
+
+def _reimburse_amount(days, miles, receipts):
+    # Unrounded reimbursement; reimburse() and the compiled variant round it
     intercept = 266.71
     coef_days = 50.05
     coef_miles = 0.4456
@@ -13,24 +78,155 @@ def reimburse(days: int, miles: int, receipts: float) -> float:
 
     amount = intercept + coef_days * days + coef_miles * capped_miles + coef_receipts * capped_receipts
 
-    receipts_str = f"{receipts:.2f}"
-    if receipts_str.endswith('.49') or receipts_str.endswith('.99'):
-        amount *= 0.457
-    else:
-        high_value = receipts > 1800 or miles > 800
-        if days == 5:
-            amount *= 0.92
-        elif 7 <= days <= 8 and high_value:
-            amount *= 1.25
-        elif 11 <= days <= 14 and high_value:
-            amount *= 0.85
-        elif 13 <= days <= 14 and high_value:
-            amount *= 1.20
-        elif days < 2:
-            amount *= 1.15
-
-        miles_per_day = miles / days if days > 0 else 0
-        if 180 <= miles_per_day <= 220:
-            amount *= 1.03
-
-    return round(amount, 2)
+    # Case features
+    cents = int(round(receipts * 100)) % 100
+    rounding_bug = cents == 49 or cents == 99
+    high_value = receipts > 1800 or miles > 800
+    miles_per_day = miles / days if days > 0 else 0.0
+    efficient = 180 <= miles_per_day <= 220
+
+    bucket = _day_bucket(days)
+    day_factor, efficiency_factor = _ADJUSTMENTS[((bucket * 2 + high_value) * 2 + rounding_bug) * 2 + efficient]
+    return amount * day_factor * efficiency_factor
+
+
+def reimburse(days: int, miles: int, receipts: float) -> float:
+    # float(): round() on an np.float64 would use numpy's rounding instead
+    return round(float(_reimburse_amount(days, miles, receipts)), 2)
+
+
+def _round_cents(amount):
+    """round(x, 2) over an ndarray, matching the builtin value for value.
+
+    np.round scales by 100 and rounds half to even in binary, so amounts
+    sitting on a half cent can land a cent away from round(), which rounds
+    the exact decimal value. Those near-ties are redone with round().
+    """
+    import numpy as np
+
+    amount = np.asarray(amount, dtype=np.float64)
+    rounded = np.round(amount, 2, out=np.empty_like(amount))
+    scaled = amount * 100
+    ties = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if ties.any():
+        rounded[ties] = [round(a, 2) for a in amount[ties].tolist()]
+    return rounded[()]
+
+
+def reimburse_batch(days, miles, receipts):
+    """Vectorized reimburse() over equal-length arrays of cases.
+
+    Mirrors the scalar rules with boolean masks and the shared adjustment
+    table. numpy is imported here so the single-case CLI path
+    stays dependency-free.
+    """
+    import numpy as np
+
+    days = np.asarray(days)
+    miles = np.asarray(miles, dtype=np.float64)
+    receipts = np.asarray(receipts, dtype=np.float64)
+
+    intercept = 266.71
+    coef_days = 50.05
+    coef_miles = 0.4456
+    coef_receipts = 0.3829
+
+    capped_miles = np.where(miles > 800, 800 + (miles - 800) * 0.25, miles)
+    capped_receipts = np.where(receipts > 1800, 1800 + (receipts - 1800) * 0.15, receipts)
+
+    amount = intercept + coef_days * days + coef_miles * capped_miles + coef_receipts * capped_receipts
+
+    cents = np.rint(receipts * 100).astype(np.int64) % 100
+    rounding_bug = (cents == 49) | (cents == 99)
+
+    high_value = (receipts > 1800) | (miles > 800)
+    miles_per_day = np.divide(miles, days, out=np.zeros_like(miles), where=days > 0)
+    efficient = (miles_per_day >= 180) & (miles_per_day <= 220)
+
+    # _day_bucket() over arrays: the same ranges, first match wins
+    bucket = np.select(
+        [days < _SHORT_BELOW] + [(days >= first) & (days <= last) for _, first, last in _DAY_RANGES],
+        [_SHORT] + [bucket for bucket, _, _ in _DAY_RANGES],
+        default=_OTHER,
+    )
+    key = ((bucket * 2 + high_value) * 2 + rounding_bug) * 2 + efficient
+    factors = np.asarray(_ADJUSTMENTS)[key]
+    amount = amount * factors[..., 0] * factors[..., 1]
+
+    return _round_cents(amount)
+
+
+@lru_cache(maxsize=4096)
+def _reimburse_cents(days, miles, receipt_cents):
+    # Keyed on integer cents so equal amounts hash equal regardless of float noise
+    return reimburse(days, miles, receipt_cents / 100)
+
+
+class ReimbursementCalculator:
+    """Calculator interface used by the analysis scripts.
+
+    The calculator is stateless, so scalar results are memoized in a single
+    module-level cache shared by every instance.
+    """
+
+    def calculate(self, days, miles, receipts):
+        """Reimbursement for a single trip."""
+        return _reimburse_cents(days, miles, int(round(receipts * 100)))
+
+    @staticmethod
+    def cache_clear():
+        """Drop all memoized calculate() results."""
+        _reimburse_cents.cache_clear()
+
+    def calculate_batch(self, days, miles, receipts):
+        """Reimbursements for arrays of trips, as a float64 ndarray.
+
+        Receipts are snapped to whole cents first, exactly as calculate()
+        does, so both methods agree case for case.
+        """
+        import numpy as np
+
+        receipt_cents = np.rint(np.asarray(receipts, dtype=np.float64) * 100)
+        return reimburse_batch(days, miles, receipt_cents / 100)
+
+
+@lru_cache(maxsize=1)
+def get_calculator():
+    """The ReimbursementCalculator instance shared by every caller in this process."""
+    return ReimbursementCalculator()
+
+
+def main(argv=None):
+    """CLI entry point: one case from argv, or many with --stdin.
+
+    --stdin reads whitespace-separated "days miles receipts" lines and
+    prints one result per line, so a whole case file costs a single
+    interpreter start-up and one reimburse_batch() call.
+    """
+    args = sys.argv[1:] if argv is None else argv
+
+    if args == ['--stdin']:
+        import numpy as np
+
+        # Empty input is a valid (empty) batch, not worth loadtxt's warning
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            cases = np.loadtxt(sys.stdin, ndmin=2)
+        if cases.size:
+            results = reimburse_batch(cases[:, 0], cases[:, 1], cases[:, 2])
+            np.savetxt(sys.stdout, results, fmt='%.2f')
+        return 0
+
+    if len(args) != 3:
+        print("Usage: calculate_reimbursement.py <trip_duration_days> <miles_traveled> <total_receipts_amount>",
+              file=sys.stderr)
+        print("       calculate_reimbursement.py --stdin < cases.txt", file=sys.stderr)
+        return 1
+
+    days, miles, receipts = int(args[0]), float(args[1]), float(args[2])
+    print(f"{reimburse(days, miles, receipts):.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
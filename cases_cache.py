@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Load public_cases.json once and reuse a binary columnar copy on later runs
+"""
+
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+CASES_JSON = 'public_cases.json'
+COLUMNS = ['days', 'miles', 'receipts', 'expected']
+# Files larger than this are streamed with ijson when it is installed;
+# anything smaller is parsed whole, where orjson is several times faster
+STREAM_THRESHOLD = 256 * 1024 * 1024
+
+def read_cases(path=CASES_JSON):
+    """The case file as its raw list of dicts
+
+    Uses orjson's C parser when it is installed, falling back to json.
+    """
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def is_fresh(cache_path, sources):
+    """True if cache_path exists and is at least as new as every source file"""
+    return os.path.exists(cache_path) and all(os.path.getmtime(p) <= os.path.getmtime(cache_path) for p in sources)
+
+def atomic_write(path, writer):
+    """Write path by calling writer(f) on a temporary binary file
+
+    Each call gets its own temporary file next to path, moved into place only
+    once it is complete, so a concurrent run never reads a partial cache. The
+    temporary file is removed if writer fails.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            writer(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _fill_columns(cases, capacity):
+    """Typed column arrays filled in a single pass over an iterable of cases
+
+    Arrays start at capacity and double when a stream turns out longer.
+    """
+    # Day counts fit in int16 with room for products like 75 * days; miles stay
+    # float since some trips log fractional mileage, and money needs float64 cents.
+    days = np.empty(capacity, dtype=np.int16)
+    miles = np.empty(capacity, dtype=np.float64)
+    receipts = np.empty(capacity, dtype=np.float64)
+    expected = np.empty(capacity, dtype=np.float64)
+
+    n = 0
+    for case in cases:
+        if n == len(days):
+            days, miles, receipts, expected = (
+                np.concatenate([column, np.empty_like(column)]) for column in (days, miles, receipts, expected))
+        trip = case['input']
+        days[n] = trip['trip_duration_days']
+        miles[n] = trip['miles_traveled']
+        receipts[n] = trip['total_receipts_amount']
+        expected[n] = case['expected_output']
+        n += 1
+
+    return {'days': days[:n], 'miles': miles[:n], 'receipts': receipts[:n], 'expected': expected[:n]}
+
+def parse_cases(path=CASES_JSON):
+    """Parse the case file into a dict of column arrays
+
+    Files over STREAM_THRESHOLD bytes are streamed case by case with ijson,
+    when it is installed, so the full list of dicts is never held in
+    memory; everything else goes through read_cases().
+    """
+    if ijson is not None and os.path.getsize(path) > STREAM_THRESHOLD:
+        with open(path, 'rb') as f:
+            return _fill_columns(ijson.items(f, 'item', use_float=True), capacity=1024)
+
+    data = read_cases(path)
+    return _fill_columns(data, capacity=max(len(data), 1))
+
+def load_cases(path=CASES_JSON, cache_path=None):
+    """Cases as a DataFrame of days, miles, receipts and expected, plus the
+    miles_per_day and receipts_per_day ratios every analysis uses
+
+    The parsed columns are saved to cache_path (by default the JSON path
+    with an .npz extension, so each case file gets its own cache) and
+    reused for as long as it is at least as new as the JSON file and this
+    module, skipping JSON parsing entirely.
+    """
+    if cache_path is None:
+        cache_path = os.path.splitext(path)[0] + '.npz'
+    if is_fresh(cache_path, (path, __file__)):
+        with np.load(cache_path) as cached:
+            columns = {name: cached[name] for name in COLUMNS}
+    else:
+        columns = parse_cases(path)
+        atomic_write(cache_path, lambda f: np.savez(f, **columns))
+
+    df = pd.DataFrame(columns, copy=False)
+    df['miles_per_day'] = df['miles'] / df['days']
+    df['receipts_per_day'] = df['receipts'] / df['days']
+
+    return df
@@ -3,15 +3,16 @@
 Analyze close matches to understand successful patterns
 """
 
-import pandas as pd
-import json
+import numpy as np
 from calculate_reimbursement import ReimbursementCalculator
+from cases_cache import load_cases, read_cases
+from error_analysis import load_and_predict
 
 def analyze_close_matches():
     """Analyze the cases that are almost perfect matches"""
     
-    # Load the error analysis results
-    df = pd.read_csv('error_analysis_results.csv')
+    # The error analysis predictions, from its cache when that is still fresh
+    df = load_and_predict()
     
     # Get close matches (within $1)
     close_matches = df[df['abs_error'] <= 1.00].copy()
@@ -38,19 +39,21 @@ def analyze_close_matches():
         print()
     
     # Look for common patterns
+    means = close_matches[['days', 'miles', 'receipts', 'miles_per_day', 'receipts_per_day']].mean()
     print("\nPATTERNS IN CLOSE MATCHES:")
     print("-" * 40)
-    print(f"Average days: {close_matches['days'].mean():.1f}")
-    print(f"Average miles: {close_matches['miles'].mean():.0f}")
-    print(f"Average receipts: ${close_matches['receipts'].mean():.2f}")
-    print(f"Average miles/day: {close_matches['miles_per_day'].mean():.0f}")
-    print(f"Average receipts/day: ${close_matches['receipts_per_day'].mean():.2f}")
+    print(f"Average days: {means['days']:.1f}")
+    print(f"Average miles: {means['miles']:.0f}")
+    print(f"Average receipts: ${means['receipts']:.2f}")
+    print(f"Average miles/day: {means['miles_per_day']:.0f}")
+    print(f"Average receipts/day: ${means['receipts_per_day']:.2f}")
     
     # Check trip types
+    days = close_matches['days'].to_numpy()
     print("\nTrip type distribution:")
-    print(f"  Short trips (1-3 days): {len(close_matches[close_matches['days'] <= 3])}")
-    print(f"  Medium trips (4-7 days): {len(close_matches[(close_matches['days'] >= 4) & (close_matches['days'] <= 7)])}")
-    print(f"  Long trips (8+ days): {len(close_matches[close_matches['days'] >= 8])}")
+    print(f"  Short trips (1-3 days): {(days <= 3).sum()}")
+    print(f"  Medium trips (4-7 days): {((days >= 4) & (days <= 7)).sum()}")
+    print(f"  Long trips (8+ days): {(days >= 8).sum()}")
     
     return close_matches
 
@@ -60,9 +63,12 @@ def test_simple_formula():
     print("\n\nTESTING SIMPLIFIED FORMULAS")
     print("=" * 60)
     
-    # Load data
-    with open('public_cases.json', 'r') as f:
-        data = json.load(f)
+    # Load data: the first 100 cases as arrays, miles truncated to whole miles
+    cases = load_cases().iloc[:100]
+    days = cases['days'].to_numpy()
+    miles = np.trunc(cases['miles'].to_numpy())
+    receipts = cases['receipts'].to_numpy()
+    expected = cases['expected'].to_numpy()
     
     # Test different simple formulas
     formulas = [
@@ -74,26 +80,11 @@ def test_simple_formula():
     ]
     
     for name, formula in formulas:
-        total_error = 0
-        exact_matches = 0
-        close_matches = 0
-        
-        for case in data[:100]:  # Test on first 100 cases
-            days = case['input']['trip_duration_days']
-            miles = int(case['input']['miles_traveled'])
-            receipts = case['input']['total_receipts_amount']
-            expected = case['expected_output']
-            
-            predicted = formula(days, miles, receipts)
-            error = abs(predicted - expected)
-            total_error += error
-            
-            if error <= 0.01:
-                exact_matches += 1
-            if error <= 1.00:
-                close_matches += 1
+        error = np.abs(formula(days, miles, receipts) - expected)
+        exact_matches = (error <= 0.01).sum()
+        close_matches = (error <= 1.00).sum()
         
-        avg_error = total_error / 100
+        avg_error = error.sum() / 100
         print(f"\n{name}:")
         print(f"  Average error: ${avg_error:.2f}")
         print(f"  Exact matches: {exact_matches}")
@@ -106,23 +97,25 @@ def analyze_exact_formula_possibility():
     print("=" * 60)
     
     # Load data
-    with open('public_cases.json', 'r') as f:
-        data = json.load(f)
+    data = read_cases()
     
     # Check if outputs are always rounded to cents
     print("Checking decimal patterns in expected outputs:")
-    decimal_counts = {}
+    expected = np.array([case['expected_output'] for case in data], dtype=np.float64)
+    cents = np.rint(expected * 100).astype(np.int64) % 100
+    decimal_counts = np.bincount(cents, minlength=100)
     
-    for case in data:
-        expected = case['expected_output']
-        decimal_part = f"{expected:.2f}".split('.')[-1]
-        decimal_counts[decimal_part] = decimal_counts.get(decimal_part, 0) + 1
+    # Ties keep first-seen order; np.unique gives each ending's earliest index
+    endings, first_idx = np.unique(cents, return_index=True)
+    first_seen = np.full(100, len(cents))
+    first_seen[endings] = first_idx
     
     # Show most common decimal endings
-    sorted_decimals = sorted(decimal_counts.items(), key=lambda x: x[1], reverse=True)
+    sorted_decimals = np.lexsort((first_seen, -decimal_counts))
     print("Most common decimal endings:")
-    for decimal, count in sorted_decimals[:10]:
-        print(f"  .{decimal}: {count} times")
+    for decimal in sorted_decimals[:10]:
+        if decimal_counts[decimal]:
+            print(f"  .{decimal:02d}: {decimal_counts[decimal]} times")
     
     # Check for integer patterns
     print("\nChecking for integer patterns:")
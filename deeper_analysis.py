@@ -3,28 +3,19 @@
 Deeper analysis to understand the true calculation patterns
 """
 
-import json
-import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
+from cases_cache import load_cases
+
+def fast_lr(X, y):
+    """(intercept, coefficients) of an ordinary least-squares fit via the normal equations"""
+    Xb = np.column_stack([np.ones(len(X)), X])
+    theta = np.linalg.solve(Xb.T @ Xb, Xb.T @ y)
+    return theta[0], theta[1:]
 
 def load_and_prepare_data():
     """Load and prepare the data for analysis"""
-    with open('public_cases.json', 'r') as f:
-        data = json.load(f)
-    
-    df = pd.DataFrame([{
-        'days': case['input']['trip_duration_days'],
-        'miles': case['input']['miles_traveled'],
-        'receipts': case['input']['total_receipts_amount'],
-        'expected': case['expected_output']
-    } for case in data])
-    
-    # Add derived features
-    df['miles_per_day'] = df['miles'] / df['days']
-    df['receipts_per_day'] = df['receipts'] / df['days']
-    
-    return df
+    # Cached columns, with miles_per_day and receipts_per_day already derived
+    return load_cases()
 
 def analyze_base_component(df):
     """Try to isolate the base per diem component"""
@@ -34,11 +25,10 @@ def analyze_base_component(df):
     # Look at trips with minimal miles and receipts
     minimal_trips = df[(df['miles'] < 50) & (df['receipts'] < 50)]
     
-    for days in range(1, 8):
-        subset = minimal_trips[minimal_trips['days'] == days]
-        if len(subset) > 0:
-            avg_reimb = subset['expected'].mean()
-            print(f"{days} days (minimal miles/receipts): ${avg_reimb:.2f} total, ${avg_reimb/days:.2f}/day")
+    # One grouped pass; durations with no minimal trips simply don't appear
+    by_days = minimal_trips.groupby('days')['expected'].mean()
+    for days, avg_reimb in by_days.loc[1:7].items():
+        print(f"{days} days (minimal miles/receipts): ${avg_reimb:.2f} total, ${avg_reimb/days:.2f}/day")
 
 def analyze_mileage_component(df):
     """Analyze mileage reimbursement patterns"""
@@ -53,12 +43,11 @@ def analyze_mileage_component(df):
         X = one_day_minimal_receipts['miles'].values.reshape(-1, 1)
         y = one_day_minimal_receipts['expected'].values
         
-        model = LinearRegression()
-        model.fit(X, y)
+        intercept, coef = fast_lr(X, y)
         
         print(f"Linear regression on 1-day trips with minimal receipts:")
-        print(f"  Intercept (base): ${model.intercept_:.2f}")
-        print(f"  Miles coefficient: ${model.coef_[0]:.4f}/mile")
+        print(f"  Intercept (base): ${intercept:.2f}")
+        print(f"  Miles coefficient: ${coef[0]:.4f}/mile")
     
     # Analyze by mileage ranges
     print("\nAverage reimbursement by mileage range (1-day trips):")
@@ -97,23 +86,20 @@ def find_simple_pattern(df):
     print("-" * 60)
     
     # Multiple linear regression
-    from sklearn.preprocessing import PolynomialFeatures
-    
     # Try simple linear model first
     X = df[['days', 'miles', 'receipts']].values
     y = df['expected'].values
     
-    model = LinearRegression()
-    model.fit(X, y)
+    intercept, coef = fast_lr(X, y)
     
     print("Simple linear regression:")
-    print(f"  Intercept: ${model.intercept_:.2f}")
-    print(f"  Days coefficient: ${model.coef_[0]:.2f}")
-    print(f"  Miles coefficient: ${model.coef_[1]:.4f}")
-    print(f"  Receipts coefficient: ${model.coef_[2]:.4f}")
+    print(f"  Intercept: ${intercept:.2f}")
+    print(f"  Days coefficient: ${coef[0]:.2f}")
+    print(f"  Miles coefficient: ${coef[1]:.4f}")
+    print(f"  Receipts coefficient: ${coef[2]:.4f}")
     
     # Calculate R-squared
-    predictions = model.predict(X)
+    predictions = intercept + X @ coef
     ss_res = np.sum((y - predictions) ** 2)
     ss_tot = np.sum((y - np.mean(y)) ** 2)
     r_squared = 1 - (ss_res / ss_tot)
@@ -126,9 +112,11 @@ def find_simple_pattern(df):
         (5, 130, 306.90)
     ]
     
+    # Predict every test case in one matrix product
+    test_preds = intercept + np.array(test_cases, dtype=np.float64) @ coef
+    
     print("\nPredictions on test cases:")
-    for days, miles, receipts in test_cases:
-        pred = model.predict([[days, miles, receipts]])[0]
+    for (days, miles, receipts), pred in zip(test_cases, test_preds):
         actual_idx = df[(df['days'] == days) & (df['miles'] == miles) & 
                        (abs(df['receipts'] - receipts) < 0.01)].index
         if len(actual_idx) > 0:
@@ -3,22 +3,13 @@
 Analyze if the system uses discrete rules or lookup tables
 """
 
-import json
 import pandas as pd
 import numpy as np
+from scipy.spatial import cKDTree
+from cases_cache import load_cases
 
 def load_data():
-    with open('public_cases.json', 'r') as f:
-        data = json.load(f)
-    
-    df = pd.DataFrame([{
-        'days': case['input']['trip_duration_days'],
-        'miles': case['input']['miles_traveled'],
-        'receipts': case['input']['total_receipts_amount'],
-        'expected': case['expected_output']
-    } for case in data])
-    
-    return df
+    return load_cases()
 
 def analyze_base_rates(df):
     """Check if there are fixed base rates per day"""
@@ -26,16 +17,17 @@ def analyze_base_rates(df):
     print("=" * 60)
     
     # Look at trips with very minimal miles and receipts
-    minimal = df[(df['miles'] < 20) & (df['receipts'] < 10)]
+    days, miles, receipts, expected = (df[c].to_numpy() for c in ('days', 'miles', 'receipts', 'expected'))
+    minimal = (miles < 20) & (receipts < 10)
     
     print("Trips with minimal miles (<20) and receipts (<$10):")
     print(f"{'Days':>4} {'Miles':>6} {'Receipts':>8} {'Expected':>10} {'Per Day':>10}")
     print("-" * 50)
     
-    for _, row in minimal.iterrows():
-        per_day = row['expected'] / row['days']
-        print(f"{row['days']:4.0f} {row['miles']:6.0f} {row['receipts']:8.2f} "
-              f"{row['expected']:10.2f} {per_day:10.2f}")
+    for d, m, r, e in zip(days[minimal], miles[minimal], receipts[minimal], expected[minimal]):
+        per_day = e / d
+        print(f"{d:4.0f} {m:6.0f} {r:8.2f} "
+              f"{e:10.2f} {per_day:10.2f}")
 
 def analyze_mileage_rates(df):
     """Check if mileage follows fixed rates or tiers"""
@@ -43,18 +35,20 @@ def analyze_mileage_rates(df):
     print("=" * 60)
     
     # Look at 1-day trips with minimal receipts to isolate mileage effect
-    one_day_minimal = df[(df['days'] == 1) & (df['receipts'] < 10)]
-    one_day_minimal = one_day_minimal.sort_values('miles')
+    days, miles, receipts, expected = (df[c].to_numpy() for c in ('days', 'miles', 'receipts', 'expected'))
+    one_day_minimal = np.flatnonzero((days == 1) & (receipts < 10))
+    one_day_minimal = one_day_minimal[np.argsort(miles[one_day_minimal])]
     
     print("1-day trips with minimal receipts (<$10):")
     print(f"{'Miles':>6} {'Receipts':>8} {'Expected':>10} {'Implied $/mile':>15}")
     print("-" * 50)
     
-    for _, row in one_day_minimal.head(20).iterrows():
+    top = one_day_minimal[:20]
+    for m, r, e in zip(miles[top], receipts[top], expected[top]):
         # Subtract assumed base (100) to get mileage portion
-        mileage_portion = row['expected'] - 100
-        rate_per_mile = mileage_portion / row['miles'] if row['miles'] > 0 else 0
-        print(f"{row['miles']:6.0f} {row['receipts']:8.2f} {row['expected']:10.2f} "
+        mileage_portion = e - 100
+        rate_per_mile = mileage_portion / m if m > 0 else 0
+        print(f"{m:6.0f} {r:8.2f} {e:10.2f} "
               f"{rate_per_mile:15.4f}")
 
 def analyze_receipt_patterns(df):
@@ -63,26 +57,24 @@ def analyze_receipt_patterns(df):
     print("=" * 60)
     
     # Group by receipt ranges
-    receipt_ranges = [
-        (0, 10), (10, 50), (50, 100), (100, 200), (200, 500),
-        (500, 1000), (1000, 1500), (1500, 2500)
-    ]
+    receipt_bins = [0, 10, 50, 100, 200, 500, 1000, 1500, 2500]
     
     print("Average reimbursement rate by receipt range:")
     print(f"{'Receipt Range':>20} {'Avg Rate':>10} {'Count':>8}")
     print("-" * 40)
     
-    for min_r, max_r in receipt_ranges:
-        subset = df[(df['receipts'] >= min_r) & (df['receipts'] < max_r)]
-        if len(subset) > 0:
-            # Calculate implied receipt reimbursement rate
-            # Subtract base per diem and estimated mileage
-            subset['base_estimate'] = subset['days'] * 100 + subset['miles'] * 0.45
-            subset['receipt_portion'] = subset['expected'] - subset['base_estimate']
-            subset['receipt_rate'] = subset['receipt_portion'] / subset['receipts']
-            
-            avg_rate = subset['receipt_rate'].mean()
-            print(f"${min_r:4d} - ${max_r:4d} {avg_rate:10.3f} {len(subset):8d}")
+    # Calculate implied receipt reimbursement rate
+    # Subtract base per diem and estimated mileage
+    base_estimate = df['days'] * 100 + df['miles'] * 0.45
+    receipt_rate = (df['expected'] - base_estimate) / df['receipts']
+    
+    # right=False keeps the half-open [min, max) ranges
+    receipt_range = pd.cut(df['receipts'], bins=receipt_bins, right=False, labels=False)
+    stats = receipt_rate.groupby(receipt_range).agg(['mean', 'size'])
+    
+    for code, avg_rate, count in zip(stats.index, stats['mean'], stats['size']):
+        min_r, max_r = receipt_bins[int(code)], receipt_bins[int(code) + 1]
+        print(f"${min_r:4d} - ${max_r:4d} {avg_rate:10.3f} {count:8d}")
 
 def find_exact_matches_pattern(df):
     """Look for patterns that might lead to exact matches"""
@@ -95,25 +87,16 @@ def find_exact_matches_pattern(df):
         ("100*d + 0.45*m + 0.45*r", lambda d, m, r: 100*d + 0.45*m + 0.45*r),
         ("75*d + 0.50*m + 0.40*r", lambda d, m, r: 75*d + 0.50*m + 0.40*r),
         ("ceil(100*d + 0.5*(m+r))", lambda d, m, r: np.ceil(100*d + 0.5*(m+r))),
-        ("round(100*d + 0.45*m + 0.45*r, 2)", lambda d, m, r: round(100*d + 0.45*m + 0.45*r, 2)),
+        ("round(100*d + 0.45*m + 0.45*r, 2)", lambda d, m, r: np.round(100*d + 0.45*m + 0.45*r, 2)),
     ]
     
+    d, m, r, expected = df[['days', 'miles', 'receipts', 'expected']].to_numpy().T
+    
     for name, formula in formulas:
-        exact_matches = 0
-        close_matches = 0
-        total_error = 0
-        
-        for _, row in df.iterrows():
-            predicted = formula(row['days'], row['miles'], row['receipts'])
-            error = abs(predicted - row['expected'])
-            total_error += error
-            
-            if error < 0.01:
-                exact_matches += 1
-            if error < 1.00:
-                close_matches += 1
-        
-        avg_error = total_error / len(df)
+        error = np.abs(formula(d, m, r) - expected)
+        exact_matches = (error < 0.01).sum()
+        close_matches = (error < 1.00).sum()
+        avg_error = error.sum() / len(df)
         print(f"\n{name}:")
         print(f"  Exact matches: {exact_matches}")
         print(f"  Close matches: {close_matches}")
@@ -125,9 +108,6 @@ def analyze_trip_categories(df):
     print("=" * 60)
     
     # Define potential categories
-    df['miles_per_day'] = df['miles'] / df['days']
-    df['receipts_per_day'] = df['receipts'] / df['days']
-    
     # Category 1: Short local trips
     cat1 = df[(df['days'] <= 2) & (df['miles'] < 100)]
     print(f"Short local trips (≤2 days, <100 miles): {len(cat1)} cases")
@@ -153,11 +133,16 @@ def check_for_lookup_table(df):
     print("\n\nCHECKING FOR LOOKUP TABLE PATTERNS")
     print("=" * 60)
     
-    # Group by exact input combinations
-    grouped = df.groupby(['days', 'miles', 'receipts'])['expected'].agg(['count', 'mean', 'std'])
+    # Each exact input combination as an integer row (miles and receipts in cents)
+    miles_cents = np.rint(df['miles'].to_numpy() * 100).astype(np.int64)
+    receipt_cents = np.rint(df['receipts'].to_numpy() * 100).astype(np.int64)
+    rows = np.column_stack([df['days'].to_numpy().astype(np.int64), miles_cents, receipt_cents])
+    _, inverse, counts = np.unique(rows, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
     
     # Find combinations that appear multiple times
-    duplicates = grouped[grouped['count'] > 1]
+    repeated = df[counts[inverse] > 1]
+    duplicates = repeated.groupby(['days', 'miles', 'receipts'])['expected'].agg(['count', 'mean', 'std'])
     
     if len(duplicates) > 0:
         print(f"Found {len(duplicates)} input combinations that appear multiple times:")
@@ -168,15 +153,18 @@ def check_for_lookup_table(df):
     # Check if similar inputs give similar outputs
     print("\nChecking consistency for similar inputs:")
     
-    # Find cases with very similar inputs
-    for i in range(min(5, len(df))):
+    # Find cases with very similar inputs: same days, miles and receipts within 5.
+    # Under the max-norm a radius-5 ball is exactly that box once days are
+    # stretched far enough apart that different day counts never fall inside it.
+    points = df[['days', 'miles', 'receipts']].to_numpy(dtype=np.float64)
+    points[:, 0] *= 1e6
+    tree = cKDTree(points)
+    n_base = min(5, len(df))
+    neighbours = tree.query_ball_point(points[:n_base], r=5, p=np.inf)
+    
+    for i in range(n_base):
         row = df.iloc[i]
-        similar = df[
-            (abs(df['days'] - row['days']) <= 0) &
-            (abs(df['miles'] - row['miles']) <= 5) &
-            (abs(df['receipts'] - row['receipts']) <= 5) &
-            (df.index != i)
-        ]
+        similar = df.iloc[sorted(j for j in neighbours[i] if j != i)]
         
         if len(similar) > 0:
             print(f"\nBase case: {row['days']}d, {row['miles']}mi, ${row['receipts']:.2f} → ${row['expected']:.2f}")
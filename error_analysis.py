@@ -3,45 +3,61 @@
 Detailed error analysis to understand prediction patterns
 """
 
-import json
+import sys
+
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from calculate_reimbursement import ReimbursementCalculator
+import calculate_reimbursement
+import cases_cache
+from calculate_reimbursement import get_calculator
+from cases_cache import CASES_JSON, atomic_write, is_fresh, load_cases
 
-def load_and_predict():
-    """Load data and generate predictions"""
-    with open('public_cases.json', 'r') as f:
-        data = json.load(f)
-    
-    calculator = ReimbursementCalculator()
-    results = []
-    
-    for case in data:
-        days = case['input']['trip_duration_days']
-        miles = int(case['input']['miles_traveled'])
-        receipts = case['input']['total_receipts_amount']
-        expected = case['expected_output']
-        
-        predicted = calculator.calculate(days, miles, receipts)
-        error = predicted - expected
-        percent_error = (error / expected) * 100 if expected > 0 else 0
-        
-        results.append({
-            'days': days,
-            'miles': miles,
-            'receipts': receipts,
-            'expected': expected,
-            'predicted': predicted,
-            'error': error,
-            'abs_error': abs(error),
-            'percent_error': percent_error,
-            'miles_per_day': miles / days,
-            'receipts_per_day': receipts / days,
-            'rounding_bug': str(receipts).endswith('.49') or str(receipts).endswith('.99')
-        })
-    
-    return pd.DataFrame(results)
+PREDICTIONS_CACHE = 'error_analysis_predictions.pkl'
+
+def _predict_cases():
+    """Predict every public case and tabulate the errors"""
+    cases = load_cases()
+    days = cases['days'].to_numpy(dtype=np.int32)
+    miles = cases['miles'].to_numpy().astype(np.int32)  # truncated, as calculate() is scored on whole miles
+    receipts = cases['receipts'].to_numpy()
+    expected = cases['expected'].to_numpy()
+    
+    predicted = get_calculator().calculate_batch(days, miles, receipts)
+    error = predicted - expected
+    percent_error = np.divide(error, expected, out=np.zeros_like(error), where=expected > 0) * 100
+    
+    # Integer cents, so the test doesn't depend on how a float formats
+    cents = np.rint(receipts * 100).astype(np.int64) % 100
+    
+    return pd.DataFrame({
+        'days': days,
+        'miles': miles,
+        'receipts': receipts,
+        'expected': expected,
+        'predicted': predicted,
+        'error': error,
+        'abs_error': np.abs(error),
+        'percent_error': percent_error,
+        'miles_per_day': miles / days,
+        'receipts_per_day': receipts / days,
+        'rounding_bug': (cents == 49) | (cents == 99)
+    })
+
+def load_and_predict(cache_path=PREDICTIONS_CACHE):
+    """Load data and generate predictions
+
+    The results table is pickled to cache_path and reused for as long as it
+    is at least as new as the calculator, the case loader, this script and the
+    case file.
+    """
+    sources = (calculate_reimbursement.__file__, cases_cache.__file__, __file__, CASES_JSON)
+    if is_fresh(cache_path, sources):
+        return pd.read_pickle(cache_path)
+    
+    df = _predict_cases()
+    atomic_write(cache_path, df.to_pickle)
+    
+    return df
 
 def analyze_error_distribution(df):
     """Analyze the distribution of errors"""
@@ -60,8 +76,8 @@ def analyze_error_distribution(df):
     
     print("\nError percentiles:")
     percentiles = [10, 25, 50, 75, 90, 95, 99]
-    for p in percentiles:
-        value = np.percentile(df['abs_error'], p)
+    values = np.percentile(df['abs_error'].to_numpy(), percentiles)  # one sort for all of them
+    for p, value in zip(percentiles, values):
         print(f"  {p}th percentile: ${value:.2f}")
 
 def analyze_best_matches(df):
@@ -112,19 +128,21 @@ def analyze_by_category(df):
     
     # By trip duration
     print("By trip duration:")
-    for days in sorted(df['days'].unique()):
-        subset = df[df['days'] == days]
-        print(f"  {days} days: mean error ${subset['error'].mean():6.2f}, "
-              f"median ${subset['error'].median():6.2f} (n={len(subset)})")
+    by_days = df.groupby('days')['error'].agg(['mean', 'median', 'size'])
+    for days, mean, median, size in by_days.itertuples():
+        print(f"  {days} days: mean error ${mean:6.2f}, "
+              f"median ${median:6.2f} (n={size})")
     
     # By mileage ranges
     print("\nBy mileage range:")
-    mile_ranges = [(0, 100), (100, 300), (300, 600), (600, 900), (900, 1500)]
-    for min_m, max_m in mile_ranges:
-        subset = df[(df['miles'] >= min_m) & (df['miles'] < max_m)]
-        if len(subset) > 0:
-            print(f"  {min_m:4d}-{max_m:4d} miles: mean error ${subset['error'].mean():6.2f}, "
-                  f"median ${subset['error'].median():6.2f} (n={len(subset)})")
+    mile_bins = [0, 100, 300, 600, 900, 1500]
+    # Half-open [min, max) ranges; empty ones don't appear in the groupby result
+    mile_range = pd.cut(df['miles'], bins=mile_bins, right=False, labels=False)
+    by_miles = df['error'].groupby(mile_range).agg(['mean', 'median', 'size'])
+    for code, mean, median, size in by_miles.itertuples():
+        min_m, max_m = mile_bins[int(code)], mile_bins[int(code) + 1]
+        print(f"  {min_m:4d}-{max_m:4d} miles: mean error ${mean:6.2f}, "
+              f"median ${median:6.2f} (n={size})")
     
     # Rounding bug cases
     print("\nRounding bug analysis:")
@@ -147,8 +165,11 @@ def find_systematic_patterns(df):
     
     # Check correlation between error and inputs
     print("\nCorrelation between error and inputs:")
-    correlations = df[['days', 'miles', 'receipts', 'miles_per_day', 'receipts_per_day']].corrwith(df['error'])
-    for col, corr in correlations.items():
+    columns = ['days', 'miles', 'receipts', 'miles_per_day', 'receipts_per_day']
+    # Correlation of each input with the error
+    stacked = np.vstack([df[columns].to_numpy(dtype=np.float64).T, df['error'].to_numpy()])
+    correlations = np.corrcoef(stacked)[-1, :-1]
+    for col, corr in zip(columns, correlations):
         print(f"  {col}: {corr:.3f}")
     
     # Look for threshold effects
@@ -163,6 +184,9 @@ def find_systematic_patterns(df):
 
 def create_error_visualizations(df):
     """Create visualizations of error patterns"""
+    # Imported here so loading the predictions never pulls in matplotlib
+    import matplotlib.pyplot as plt
+    
     fig, axes = plt.subplots(2, 2, figsize=(12, 10))
     fig.suptitle('Error Analysis Visualizations', fontsize=16)
     
@@ -185,7 +209,13 @@ def create_error_visualizations(df):
     
     # 3. Error by trip duration
     ax = axes[1, 0]
-    df.boxplot(column='error', by='days', ax=ax)
+    # Whiskers span the 10th-90th percentiles
+    quantiles = df.groupby('days')['error'].quantile([0.1, 0.25, 0.5, 0.75, 0.9]).unstack()
+    stats = [
+        dict(label=days, whislo=q[0.1], q1=q[0.25], med=q[0.5], q3=q[0.75], whishi=q[0.9], fliers=[])
+        for days, q in quantiles.iterrows()
+    ]
+    ax.bxp(stats, showfliers=False)
     ax.set_xlabel('Trip Duration (days)')
     ax.set_ylabel('Prediction Error ($)')
     ax.set_title('Error by Trip Duration')
@@ -198,7 +228,7 @@ def create_error_visualizations(df):
     ax.set_title('Absolute Error vs Miles')
     
     plt.tight_layout()
-    plt.savefig('error_analysis.png', dpi=300)
+    plt.savefig('error_analysis.png', dpi=150)
     print("\nVisualizations saved to error_analysis.png")
 
 def suggest_improvements(df):
@@ -245,6 +275,7 @@ if __name__ == "__main__":
     suggest_improvements(df)
     create_error_visualizations(df)
     
-    # Save detailed results for manual inspection
-    df.to_csv('error_analysis_results.csv', index=False)
-    print("\nDetailed results saved to error_analysis_results.csv") 
\ No newline at end of file
+    # A CSV copy is only written on request, for manual inspection
+    if '--csv' in sys.argv[1:]:
+        df.to_csv('error_analysis_results.csv', index=False)
+        print("\nDetailed results saved to error_analysis_results.csv")
@@ -3,21 +3,18 @@
 Analyze high receipt cases to understand the pattern
 """
 
-import json
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+from cases_cache import load_cases
 
 def load_data():
-    with open('public_cases.json', 'r') as f:
-        data = json.load(f)
+    df = load_cases()
     
-    df = pd.DataFrame([{
-        'days': case['input']['trip_duration_days'],
-        'miles': case['input']['miles_traveled'],
-        'receipts': case['input']['total_receipts_amount'],
-        'expected': case['expected_output']
-    } for case in data])
+    # Receipt share of the reimbursement after removing estimated day and
+    # mile components; used by both the threshold table and the plots
+    df['net_receipts'] = df['expected'] - 75 * df['days'] - 0.5 * df['miles']
+    df['receipt_rate'] = df['net_receipts'] / df['receipts']
     
     return df
 
@@ -32,16 +29,17 @@ def analyze_high_receipts(df):
     print(f"Found {len(high_receipts)} cases with receipts > $2000\n")
     
     # Calculate what simple formulas would predict
-    for idx, row in high_receipts.head(20).iterrows():
+    rows = high_receipts.head(20)[['days', 'miles', 'receipts', 'expected']]
+    for days, miles, receipts, expected in rows.itertuples(index=False, name=None):
         # Simple formula prediction
-        simple = 75 * row['days'] + 0.5 * row['miles'] + 0.4 * row['receipts']
+        simple = 75 * days + 0.5 * miles + 0.4 * receipts
         
         # What fraction of receipts is reimbursed?
-        receipt_fraction = (row['expected'] - 75 * row['days'] - 0.5 * row['miles']) / row['receipts']
+        receipt_fraction = (expected - 75 * days - 0.5 * miles) / receipts
         
-        print(f"Days: {row['days']:2.0f}, Miles: {row['miles']:4.0f}, Receipts: ${row['receipts']:7.2f}")
-        print(f"  Expected: ${row['expected']:7.2f}")
-        print(f"  Simple formula: ${simple:7.2f} (error: ${simple - row['expected']:7.2f})")
+        print(f"Days: {days:2.0f}, Miles: {miles:4.0f}, Receipts: ${receipts:7.2f}")
+        print(f"  Expected: ${expected:7.2f}")
+        print(f"  Simple formula: ${simple:7.2f} (error: ${simple - expected:7.2f})")
         print(f"  Implied receipt rate: {receipt_fraction:.3f}")
         print()
 
@@ -50,29 +48,17 @@ def analyze_receipt_thresholds(df):
     print("\nRECEIPT THRESHOLD ANALYSIS")
     print("=" * 60)
     
-    # Group by receipt ranges and calculate average reimbursement rates
-    ranges = [
-        (0, 500),
-        (500, 1000),
-        (1000, 1500),
-        (1500, 2000),
-        (2000, 2500),
-        (2500, 3000)
-    ]
-    
-    for min_r, max_r in ranges:
-        subset = df[(df['receipts'] >= min_r) & (df['receipts'] < max_r)]
-        if len(subset) > 0:
-            # Calculate average reimbursement per dollar of receipts
-            # After removing estimated day and mile components
-            subset['net_receipts'] = subset['expected'] - 75 * subset['days'] - 0.5 * subset['miles']
-            subset['receipt_rate'] = subset['net_receipts'] / subset['receipts']
-            
-            avg_rate = subset['receipt_rate'].mean()
-            std_rate = subset['receipt_rate'].std()
-            
-            print(f"${min_r:4d}-${max_r:4d}: {len(subset):3d} cases, "
-                  f"avg rate: {avg_rate:6.3f} (std: {std_rate:5.3f})")
+    # Group by the half-open [min, max) receipt ranges and calculate average reimbursement rates
+    range_bins = [0, 500, 1000, 1500, 2000, 2500, 3000]
+    receipt_range = pd.cut(df['receipts'], bins=range_bins, right=False)
+    
+    # observed=True leaves empty ranges out of the result
+    stats = df.groupby(receipt_range, observed=True)['receipt_rate'].agg(
+        avg_rate='mean', std_rate='std', count='size')
+    
+    for interval, avg_rate, std_rate, count in stats.itertuples():
+        print(f"${int(interval.left):4d}-${int(interval.right):4d}: {count:3d} cases, "
+              f"avg rate: {avg_rate:6.3f} (std: {std_rate:5.3f})")
 
 def test_capped_receipts(df):
     """Test if receipts might be capped at certain amounts"""
@@ -80,23 +66,17 @@ def test_capped_receipts(df):
     print("=" * 60)
     
     # Test different cap amounts
-    caps = [1000, 1200, 1500, 1800, 2000]
+    caps = np.array([1000, 1200, 1500, 1800, 2000], dtype=np.float64)
     
-    for cap in caps:
-        total_error = 0
-        count = 0
-        
-        for _, row in df.iterrows():
-            # Calculate with capped receipts
-            capped_receipts = min(row['receipts'], cap)
-            predicted = 75 * row['days'] + 0.5 * row['miles'] + 0.4 * capped_receipts
-            
-            error = abs(predicted - row['expected'])
-            total_error += error
-            count += 1
-        
-        avg_error = total_error / count
-        print(f"Receipt cap at ${cap}: avg error ${avg_error:.2f}")
+    d, m, r, e = (df[c].to_numpy() for c in ('days', 'miles', 'receipts', 'expected'))
+    
+    # Rows are caps, columns are cases
+    base = 75 * d + 0.5 * m
+    capped_receipts = np.minimum(r, caps[:, None])
+    avg_errors = np.abs(base + 0.4 * capped_receipts - e).mean(axis=1)
+    
+    for cap, avg_error in zip(caps, avg_errors):
+        print(f"Receipt cap at ${cap:.0f}: avg error ${avg_error:.2f}")
 
 def plot_receipt_analysis(df):
     """Create visualizations for receipt patterns"""
@@ -105,16 +85,19 @@ def plot_receipt_analysis(df):
     
     # 1. Expected vs Receipts
     ax = axes[0, 0]
-    ax.scatter(df['receipts'], df['expected'], alpha=0.5, s=10)
+    ax.scatter(df['receipts'], df['expected'], alpha=0.5, s=10, rasterized=True)
     ax.set_xlabel('Total Receipts ($)')
     ax.set_ylabel('Expected Reimbursement ($)')
     ax.set_title('Reimbursement vs Receipts')
     
-    # Add trend lines for different ranges
+    # Add trend lines for different ranges; receipts are sorted, so each range is a prefix
+    order = np.argsort(df['receipts'].to_numpy())
+    receipts_sorted = df['receipts'].to_numpy()[order]
+    expected_sorted = df['expected'].to_numpy()[order]
     for max_r in [1000, 2000, 3000]:
-        subset = df[df['receipts'] <= max_r]
-        if len(subset) > 10:
-            z = np.polyfit(subset['receipts'], subset['expected'], 1)
+        k = np.searchsorted(receipts_sorted, max_r, side='right')
+        if k > 10:
+            z = np.polyfit(receipts_sorted[:k], expected_sorted[:k], 1)
             p = np.poly1d(z)
             ax.plot([0, max_r], [p(0), p(max_r)], '--', alpha=0.7, 
                    label=f'≤${max_r}')
@@ -122,17 +105,18 @@ def plot_receipt_analysis(df):
     
     # 2. Receipt processing rate by amount
     ax = axes[0, 1]
-    df['receipt_rate'] = (df['expected'] - 75 * df['days'] - 0.5 * df['miles']) / df['receipts']
     
-    # Group into bins
+    # Group into bins: digitize code i covers (bins[i-1], bins[i]]
     bins = [0, 500, 1000, 1500, 2000, 2500, 3000]
-    df['receipt_bin'] = pd.cut(df['receipts'], bins)
-    grouped = df.groupby('receipt_bin')['receipt_rate'].mean()
+    codes = np.digitize(df['receipts'].to_numpy(), bins, right=True)
+    sums = np.bincount(codes, weights=df['receipt_rate'].to_numpy(), minlength=len(bins) + 1)[1:len(bins)]
+    counts = np.bincount(codes, minlength=len(bins) + 1)[1:len(bins)]
+    means = np.divide(sums, counts, out=np.full(len(sums), np.nan), where=counts > 0)
     
-    x_pos = range(len(grouped))
-    ax.bar(x_pos, grouped.values)
+    x_pos = range(len(means))
+    ax.bar(x_pos, means)
     ax.set_xticks(x_pos)
-    ax.set_xticklabels([f"${int(b.left)}-{int(b.right)}" for b in grouped.index], rotation=45)
+    ax.set_xticklabels([f"${left}-{right}" for left, right in zip(bins[:-1], bins[1:])], rotation=45)
     ax.set_ylabel('Average Receipt Rate')
     ax.set_title('Receipt Processing Rate by Amount')
     
@@ -140,7 +124,7 @@ def plot_receipt_analysis(df):
     ax = axes[1, 0]
     high = df[df['receipts'] > 1500]
     if len(high) > 0:
-        ax.scatter(high['receipts'], high['expected'], alpha=0.7, s=30, c='red')
+        ax.scatter(high['receipts'], high['expected'], alpha=0.7, s=30, c='red', rasterized=True)
         ax.set_xlabel('Receipts ($)')
         ax.set_ylabel('Expected ($)')
         ax.set_title('High Receipt Cases (>$1500)')
@@ -148,17 +132,16 @@ def plot_receipt_analysis(df):
     # 4. Error pattern for high receipts
     ax = axes[1, 1]
     # Calculate simple prediction error
-    df['simple_pred'] = 75 * df['days'] + 0.5 * df['miles'] + 0.4 * df['receipts']
-    df['error'] = df['simple_pred'] - df['expected']
+    error = df.eval("75 * days + 0.5 * miles + 0.4 * receipts - expected")
     
-    ax.scatter(df['receipts'], df['error'], alpha=0.5, s=10)
+    ax.scatter(df['receipts'], error, alpha=0.5, s=10, rasterized=True)
     ax.axhline(0, color='red', linestyle='--')
     ax.set_xlabel('Receipts ($)')
     ax.set_ylabel('Prediction Error ($)')
     ax.set_title('Error vs Receipt Amount')
     
     plt.tight_layout()
-    plt.savefig('receipt_analysis.png', dpi=300)
+    plt.savefig('receipt_analysis.png', dpi=150)
     print("\nVisualizations saved to receipt_analysis.png")
 
 if __name__ == "__main__":
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Numba-compiled reimbursement rules for tight evaluation loops.
+
+numba is optional: without it, reimburse and reimburse_batch fall back to
+the implementations in calculate_reimbursement, so callers can import from
+here unconditionally.
+"""
+
+import types
+
+import numpy as np
+
+from calculate_reimbursement import _day_bucket, _reimburse_amount, _round_cents
+from calculate_reimbursement import reimburse as _reimburse_py
+from calculate_reimbursement import reimburse_batch as _reimburse_batch_np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+if njit is not None:
+    def _compile(func, **helpers):
+        """njit func with the module-level helpers it calls swapped for compiled ones"""
+        namespace = dict(func.__globals__, **helpers)
+        return njit(cache=True)(types.FunctionType(func.__code__, namespace, func.__name__, func.__defaults__))
+
+    # The scalar rules are purely numeric, so they compile unchanged
+    _amount = _compile(_reimburse_amount, _day_bucket=njit(cache=True)(_day_bucket))
+
+    @njit(cache=True, parallel=True)
+    def _reimburse_kernel(days, miles, receipts):
+        out = np.empty(days.shape[0])
+        for i in prange(days.shape[0]):
+            out[i] = _amount(days[i], miles[i], receipts[i])
+        return out
+
+    # Rounding stays in Python: numba's round() scales in binary like
+    # np.round and disagrees with the builtin on half cents
+    def reimburse(days, miles, receipts):
+        """Compiled reimburse()"""
+        return round(_amount(days, miles, receipts), 2)
+
+    def reimburse_batch(days, miles, receipts):
+        """Compiled reimburse() over arrays of cases, parallelized across cores"""
+        return _round_cents(_reimburse_kernel(np.ascontiguousarray(days, dtype=np.float64),
+                                              np.ascontiguousarray(miles, dtype=np.float64),
+                                              np.ascontiguousarray(receipts, dtype=np.float64)))
+else:
+    reimburse = _reimburse_py
+    reimburse_batch = _reimburse_batch_np
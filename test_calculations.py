@@ -3,29 +3,67 @@
 Test and calibrate the reimbursement calculator
 """
 
-from calculate_reimbursement import reimburse
+import contextlib
+import io
+import sys
+
+import numpy as np
+
+from calculate_reimbursement import get_calculator, main
+from cases_cache import load_cases
 
 
 def test_specific_cases():
     """Test specific cases to understand the calculation pattern"""
-    test_cases = [
+    test_cases = np.array([
         (3, 93, 1.42, 364.51),
         (1, 55, 3.6, 126.06),
         (1, 47, 17.97, 128.91),
         (5, 130, 306.90, 574.10),
         (5, 173, 1337.90, 1443.96),
-    ]
+    ], dtype=[('days', 'i4'), ('miles', 'i4'), ('receipts', 'f8'), ('expected', 'f8')])
 
     print("Testing specific cases:")
     print("-" * 80)
     print(f"{'Days':>5} {'Miles':>6} {'Receipts':>10} {'Expected':>10} {'Calculated':>12} {'Error':>10}")
     print("-" * 80)
 
-    for days, miles, receipts, expected in test_cases:
-        calculated = reimburse(days, miles, receipts)
-        error = calculated - expected
-        print(f"{days:5d} {miles:6d} {receipts:10.2f} {expected:10.2f} {calculated:12.2f} {error:10.2f}")
+    calculated = get_calculator().calculate_batch(test_cases['days'], test_cases['miles'], test_cases['receipts'])
+    errors = calculated - test_cases['expected']
+
+    for (days, miles, receipts, expected), calc, error in zip(test_cases, calculated, errors):
+        print(f"{days:5d} {miles:6d} {receipts:10.2f} {expected:10.2f} {calc:12.2f} {error:10.2f}")
+
+
+def _run_cli(argv, stdin=''):
+    """stdout of calculate_reimbursement.main(argv), fed the given stdin"""
+    out = io.StringIO()
+    saved_stdin, sys.stdin = sys.stdin, io.StringIO(stdin)
+    try:
+        with contextlib.redirect_stdout(out):
+            main(argv)
+    finally:
+        sys.stdin = saved_stdin
+    return out.getvalue()
+
+
+def test_cli_modes():
+    """Per-case CLI output must match --stdin output line for line"""
+    df = load_cases()
+    # 35 790 990 lands exactly on a half cent
+    cases = [(35, 790, 990.0)] + list(zip(df['days'].tolist(), df['miles'].tolist(), df['receipts'].tolist()))
+    lines = [f"{days} {miles} {receipts}" for days, miles, receipts in cases]
+
+    per_case = [_run_cli(line.split()).strip() for line in lines]
+    batched = _run_cli(['--stdin'], '\n'.join(lines) + '\n').split()
+
+    mismatches = [(line, a, b) for line, a, b in zip(lines, per_case, batched) if a != b]
+    print(f"\nCLI modes: {len(lines)} cases, {len(mismatches)} mismatches")
+    for line, a, b in mismatches[:10]:
+        print(f"  {line}: per-case {a}, --stdin {b}")
+    assert len(batched) == len(lines) and not mismatches
 
 
 if __name__ == "__main__":
     test_specific_cases()
+    test_cli_modes()
@@ -3,70 +3,186 @@
 Test very simple formulas to see if we're overcomplicating
 """
 
-import json
+import hashlib
+import pickle
+import types
+
 import numpy as np
+import cases_cache
+from cases_cache import CASES_JSON, COLUMNS, atomic_write, is_fresh, load_cases
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+FORMULA_CACHE = 'formula_results.pkl'
+STAT_KEYS = ('avg_error', 'max_error', 'exact_matches', 'close_matches')
 
 def load_data():
-    with open('public_cases.json', 'r') as f:
-        data = json.load(f)
-    return data
+    """The cases as a dict of float64 column arrays"""
+    cases = load_cases()
+    return {column: cases[column].to_numpy(dtype=np.float64) for column in COLUMNS}
 
 def test_formula(data, formula_func, name):
     """Test a formula and return average error"""
-    total_error = 0
-    exact_matches = 0
-    close_matches = 0
-    errors = []
-    
-    for case in data:
-        days = case['input']['trip_duration_days']
-        miles = case['input']['miles_traveled']
-        receipts = case['input']['total_receipts_amount']
-        expected = case['expected_output']
-        
-        predicted = formula_func(days, miles, receipts)
-        error = abs(predicted - expected)
-        errors.append(error)
-        total_error += error
-        
-        if error <= 0.01:
-            exact_matches += 1
-        if error <= 1.00:
-            close_matches += 1
-    
-    avg_error = total_error / len(data)
-    max_error = max(errors)
+    predicted = formula_func(data['days'], data['miles'], data['receipts'])
+    errors = np.abs(predicted - data['expected'])
     
     return {
         'name': name,
-        'avg_error': avg_error,
-        'max_error': max_error,
-        'exact_matches': exact_matches,
-        'close_matches': close_matches
+        'func': formula_func,
+        'avg_error': float(errors.mean()),
+        'max_error': float(errors.max()),
+        'exact_matches': int(np.count_nonzero(errors <= 0.01)),
+        'close_matches': int(np.count_nonzero(errors <= 1.00))
     }
 
+def linear_formula(intercept, coef_days, coef_miles, coef_receipts):
+    """The formula function for one row of linear coefficients"""
+    return lambda d, m, r: intercept + coef_days*d + coef_miles*m + coef_receipts*r
+
+if njit is not None:
+    @njit(cache=True, parallel=True)
+    def _linear_sweep(d, m, r, e, coefficients):
+        # One native pass over the cases per formula, formulas spread across cores
+        n_formulas, n = coefficients.shape[0], d.shape[0]
+        total_error = np.zeros(n_formulas)
+        max_error = np.zeros(n_formulas)
+        exact = np.zeros(n_formulas, dtype=np.int64)
+        close = np.zeros(n_formulas, dtype=np.int64)
+        for f in prange(n_formulas):
+            intercept, a, b, c = coefficients[f, 0], coefficients[f, 1], coefficients[f, 2], coefficients[f, 3]
+            for i in range(n):
+                error = abs(intercept + a*d[i] + b*m[i] + c*r[i] - e[i])
+                total_error[f] += error
+                max_error[f] = max(max_error[f], error)
+                exact[f] += error <= 0.01
+                close[f] += error <= 1.00
+        return total_error / n, max_error, exact, close
+else:
+    def _linear_sweep(d, m, r, e, coefficients):
+        # Every formula's predictions from one (formulas, 4) @ (4, cases) product
+        features = np.vstack([np.ones_like(d), d, m, r])
+        errors = np.abs(coefficients @ features - e)
+        return (errors.mean(axis=1), errors.max(axis=1, initial=0.0),
+                np.count_nonzero(errors <= 0.01, axis=1), np.count_nonzero(errors <= 1.00, axis=1))
+
+def score_linear_formulas(data, linear_formulas):
+    """test_formula() results for (name, coefficients) pairs, scored in one sweep
+
+    Coefficients are (intercept, days, miles, receipts). The sweep is compiled
+    with numba when it is installed and falls back to NumPy otherwise.
+    """
+    coefficients = np.array([coefs for _, coefs in linear_formulas], dtype=np.float64).reshape(-1, 4)
+    avg_error, max_error, exact, close = _linear_sweep(
+        data['days'], data['miles'], data['receipts'], data['expected'], coefficients)
+    
+    return [{
+        'name': name,
+        'func': linear_formula(*coefs),
+        'avg_error': float(avg_error[i]),
+        'max_error': float(max_error[i]),
+        'exact_matches': int(exact[i]),
+        'close_matches': int(close[i])
+    } for i, (name, coefs) in enumerate(linear_formulas)]
+
+def _code_digest(code):
+    """Digest of a code object, nested code objects (lambdas, comprehensions) included"""
+    consts = tuple(_code_digest(c) if isinstance(c, types.CodeType) else repr(c) for c in code.co_consts)
+    return hashlib.sha256(code.co_code + repr((consts, code.co_names)).encode()).hexdigest()
+
+def _value_key(value):
+    """Stand-in for a value a formula reads; arrays go by content, since repr() elides them"""
+    if isinstance(value, np.ndarray):
+        return (value.dtype.str, value.shape, hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest())
+    if isinstance(value, types.FunctionType):
+        return _code_digest(value.__code__)
+    return repr(value)
+
+def formula_key(name, func):
+    """Cache key for a formula: its name plus everything that defines its code
+
+    Names and closure values are part of the key, since np.minimum/np.maximum
+    or two linear_formula() coefficient rows compile to the same bytecode.
+    So are default arguments and the values of the globals it reads, e.g. a
+    module-level cap; modules are keyed by name alone.
+    """
+    code = func.__code__
+    closure = tuple(_value_key(cell.cell_contents) for cell in func.__closure__ or ())
+    defaults = tuple(_value_key(value) for value in func.__defaults__ or ())
+    kwdefaults = tuple((k, _value_key(v)) for k, v in sorted((func.__kwdefaults__ or {}).items()))
+    global_values = tuple((n, _value_key(func.__globals__[n])) for n in code.co_names
+                          if n in func.__globals__ and not isinstance(func.__globals__[n], types.ModuleType))
+    return (name, _code_digest(code), closure, defaults, kwdefaults, global_values)
+
+def _scoring_digest():
+    """Digests of the code that turns formulas into scores; any change to it invalidates the cache"""
+    scorers = (load_data, test_formula, linear_formula, _linear_sweep, score_linear_formulas)
+    return tuple(_code_digest(getattr(f, 'py_func', f).__code__) for f in scorers)
+
+def evaluate_formulas(data, linear_formulas, formulas, cache_path=FORMULA_CACHE):
+    """test_formula() results for every formula, reusing earlier runs' scores
+
+    linear_formulas lists (name, coefficients) pairs and formulas the other
+    (name, func) pairs; results come back in that order. Scores are pickled
+    to cache_path, keyed by formula_key() and valid for as long as the case
+    file, its loader and the scoring code are unchanged, so a rerun only
+    evaluates formulas it has not seen before.
+    """
+    scoring = _scoring_digest()
+    scores = {}
+    if is_fresh(cache_path, (CASES_JSON, cases_cache.__file__)):
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+        if cached.get('scoring') == scoring:
+            scores = cached['scores']
+    
+    linear = [(name, coefs, linear_formula(*coefs)) for name, coefs in linear_formulas]
+    linear_keys = [formula_key(name, func) for name, _, func in linear]
+    pending_linear = [(name, coefs) for (name, coefs, _), key in zip(linear, linear_keys) if key not in scores]
+    for result in score_linear_formulas(data, pending_linear):
+        scores[formula_key(result['name'], result['func'])] = {k: result[k] for k in STAT_KEYS}
+    
+    keys = [formula_key(name, func) for name, func in formulas]
+    for (name, func), key in zip(formulas, keys):
+        if key not in scores:
+            result = test_formula(data, func, name)
+            scores[key] = {k: result[k] for k in STAT_KEYS}
+    
+    # Keep only this sweep's formulas so retired ones don't pile up in the cache
+    named = [(name, func) for name, _, func in linear] + formulas
+    keys = linear_keys + keys
+    scores = {key: scores[key] for key in keys}
+    atomic_write(cache_path, lambda f: pickle.dump({'scoring': scoring, 'scores': scores}, f))
+    
+    return [dict(name=name, func=func, **scores[key]) for (name, func), key in zip(named, keys)]
+
 def main():
     data = load_data()
     
-    # Test various simple formulas
-    formulas = [
+    # Linear formulas as (intercept, days, miles, receipts) coefficients
+    linear_formulas = [
         # Basic linear combinations
-        ("100*d + 0.50*m + 0.50*r", lambda d, m, r: 100*d + 0.50*m + 0.50*r),
-        ("80*d + 0.45*m + 0.45*r", lambda d, m, r: 80*d + 0.45*m + 0.45*r),
-        ("60*d + 0.55*m + 0.35*r", lambda d, m, r: 60*d + 0.55*m + 0.35*r),
-        ("50*d + 0.60*m + 0.40*r", lambda d, m, r: 50*d + 0.60*m + 0.40*r),
+        ("100*d + 0.50*m + 0.50*r", (0, 100, 0.50, 0.50)),
+        ("80*d + 0.45*m + 0.45*r", (0, 80, 0.45, 0.45)),
+        ("60*d + 0.55*m + 0.35*r", (0, 60, 0.55, 0.35)),
+        ("50*d + 0.60*m + 0.40*r", (0, 50, 0.60, 0.40)),
         
         # With intercepts
-        ("200 + 40*d + 0.50*m + 0.35*r", lambda d, m, r: 200 + 40*d + 0.50*m + 0.35*r),
-        ("150 + 50*d + 0.45*m + 0.40*r", lambda d, m, r: 150 + 50*d + 0.45*m + 0.40*r),
-        
+        ("200 + 40*d + 0.50*m + 0.35*r", (200, 40, 0.50, 0.35)),
+        ("150 + 50*d + 0.45*m + 0.40*r", (150, 50, 0.45, 0.40)),
+    ]
+    
+    # Test various simple formulas
+    formulas = [
         # Capped formulas
-        ("100*d + 0.5*m + 0.4*min(r,1500)", lambda d, m, r: 100*d + 0.5*m + 0.4*min(r, 1500)),
-        ("80*d + 0.5*min(m,800) + 0.4*r", lambda d, m, r: 80*d + 0.5*min(m, 800) + 0.4*r),
+        ("100*d + 0.5*m + 0.4*min(r,1500)", lambda d, m, r: 100*d + 0.5*m + 0.4*np.minimum(r, 1500)),
+        ("80*d + 0.5*min(m,800) + 0.4*r", lambda d, m, r: 80*d + 0.5*np.minimum(m, 800) + 0.4*r),
         
         # Combined caps
         ("75*d + 0.5*min(m,1000) + 0.4*min(r,1800)", 
-         lambda d, m, r: 75*d + 0.5*min(m, 1000) + 0.4*min(r, 1800)),
+         lambda d, m, r: 75*d + 0.5*np.minimum(m, 1000) + 0.4*np.minimum(r, 1800)),
         
         # Percentage based
         ("0.1*(d*750 + m + r)", lambda d, m, r: 0.1*(d*750 + m + r)),
@@ -80,14 +196,11 @@ def main():
         ("50*d + 50*log(m+1) + 100*log(r+1)", lambda d, m, r: 50*d + 50*np.log(m+1) + 100*np.log(r+1)),
         
         # Min/max formulas
-        ("max(100*d, 0.5*(m+r))", lambda d, m, r: max(100*d, 0.5*(m+r))),
-        ("min(200*d, 100*d + 0.4*(m+r))", lambda d, m, r: min(200*d, 100*d + 0.4*(m+r))),
+        ("max(100*d, 0.5*(m+r))", lambda d, m, r: np.maximum(100*d, 0.5*(m+r))),
+        ("min(200*d, 100*d + 0.4*(m+r))", lambda d, m, r: np.minimum(200*d, 100*d + 0.4*(m+r))),
     ]
     
-    results = []
-    for name, func in formulas:
-        result = test_formula(data, func, name)
-        results.append(result)
+    results = evaluate_formulas(data, linear_formulas, formulas)
     
     # Sort by average error
     results.sort(key=lambda x: x['avg_error'])
@@ -103,7 +216,7 @@ def main():
     
     # Test the best formula on specific problem cases
     print("\n\nTesting best formula on problem cases:")
-    best_formula = formulas[results[0]['name'] == formulas[0][0]][0][1]
+    best = results[0]
     
     problem_cases = [
         (7, 1006, 1181.33, 2279.82),
@@ -112,18 +225,10 @@ def main():
     ]
     
     for days, miles, receipts, expected in problem_cases:
-        predicted = results[0]['name']
-        formula_func = None
-        for name, func in formulas:
-            if name == results[0]['name']:
-                formula_func = func
-                break
-        
-        if formula_func:
-            pred = formula_func(days, miles, receipts)
-            error = pred - expected
-            print(f"{days}d, {miles}mi, ${receipts:.2f}: "
-                  f"Expected ${expected:.2f}, Got ${pred:.2f}, Error ${error:.2f}")
+        pred = best['func'](days, miles, receipts)
+        error = pred - expected
+        print(f"{days}d, {miles}mi, ${receipts:.2f}: "
+              f"Expected ${expected:.2f}, Got ${pred:.2f}, Error ${error:.2f}")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file